@@ -0,0 +1 @@
+default_app_config = 'comments.api.apps.ApiConfig'
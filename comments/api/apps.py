@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
-    name = 'api'
+    name = 'comments.api'
+    label = 'api'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import signals
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Comment
+from .serializers import CommentDataSerializer
+
+def comment_cache_key(pk):
+    """ Get the cache key for the given comment's cached representation """
+    return 'comment:{}'.format(pk)
+
+def set_cached_comment(comment):
+    """ Store the given comment's representation in the cache and return it """
+    data = OrderedDict(CommentDataSerializer(comment).data)
+    cache.set(comment_cache_key(comment.pk), data, settings.COMMENT_CACHE_TIMEOUT)
+    return data
+
+def refresh_cached_comment(pk):
+    """ Store the given comment's current representation in the cache, or remove it if it no longer exists """
+    comment = Comment.objects.filter(pk=pk).prefetch_related('tones').first()
+    if comment is None:
+        delete_cached_comment(pk)
+        return None
+    return set_cached_comment(comment)
+
+def delete_cached_comment(pk):
+    """ Remove the given comment's representation from the cache """
+    cache.delete(comment_cache_key(pk))
+
+def delete_cached_comments(pks):
+    """ Remove the given comments' representations from the cache """
+    cache.delete_many([comment_cache_key(pk) for pk in pks])
+
+def get_cached_comments(pks):
+    """
+    Get a list of (pk, representation) tuples for the given comments, in the given order
+
+    Any comments missing from the cache are fetched from the database in a single query and added to the cache.
+    They're only added if still missing so that a newer representation written by a concurrent update isn't
+    overwritten with the one read here. Comments that no longer exist are omitted.
+    """
+    keys = OrderedDict((pk, comment_cache_key(pk)) for pk in pks)
+    cached = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        for comment in Comment.objects.filter(pk__in=missing).prefetch_related('tones'):
+            key = comment_cache_key(comment.pk)
+            cached[key] = OrderedDict(CommentDataSerializer(comment).data)
+            cache.add(key, cached[key], settings.COMMENT_CACHE_TIMEOUT)
+
+    return [(pk, cached[key]) for pk, key in keys.items() if key in cached]
+
+def get_cached_comment(pk):
+    """ Get the given comment's representation, or None if it doesn't exist """
+    comments = get_cached_comments([pk])
+    return comments[0][1] if comments else None
@@ -0,0 +1,41 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework.compat import coreapi
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+class CommentSearchFilter(BaseFilterBackend):
+    """ Full-text search over comment content using the comment's stored search vector """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        """ Filter to comments matching the search terms, ordered by rank unless an explicit ordering was requested """
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+
+        query = SearchQuery(terms, config=queryset.model.SEARCH_CONFIG)
+        queryset = queryset.annotate(rank=SearchRank(F('search_vector'), query)).filter(search_vector=query)
+
+        if self.get_requested_ordering(request, queryset, view):
+            return queryset
+        return queryset.order_by('-rank', *queryset.query.order_by)
+
+    def get_requested_ordering(self, request, queryset, view):
+        """ Get the valid fields of any ordering requested (invalid fields are ignored by the ordering filter) """
+        ordering_filter = OrderingFilter()
+        params = request.query_params.get(ordering_filter.ordering_param)
+        if not params:
+            return []
+        fields = [param.strip() for param in params.split(',')]
+        return ordering_filter.remove_invalid_fields(queryset, fields, view, request)
+
+    def get_schema_fields(self, view):
+        assert coreapi is not None, 'coreapi must be installed to use `get_schema_fields()`'
+        return [
+            coreapi.Field(
+                name=self.search_param,
+                required=False,
+                location='query',
+                description='Full-text search terms to match against the comment content',
+            ),
+        ]
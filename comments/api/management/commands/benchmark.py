@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+def process_tree(pid):
+    """ Get the IDs of the given process and all of its descendants (e.g. a server's master and worker processes) """
+    pids = [pid]
+    try:
+        tasks = os.listdir('/proc/{}/task'.format(pid))
+    except OSError:
+        return pids
+    for task in tasks:
+        try:
+            with open('/proc/{}/task/{}/children'.format(pid, task)) as children:
+                for child in children.read().split():
+                    pids.extend(process_tree(int(child)))
+        except IOError:
+            continue
+    return pids
+
+def read_rss(pids):
+    """ Get the total resident set size in kB of the given processes and all of their descendants """
+    total = 0
+    for pid in pids:
+        for tree_pid in process_tree(pid):
+            try:
+                with open('/proc/{}/status'.format(tree_pid)) as status:
+                    total += next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+            except (IOError, StopIteration):
+                if tree_pid == pid:
+                    raise CommandError('Unable to read memory usage of process {}'.format(pid))
+    return total
+
+async def read_response(reader):
+    """ Read an HTTP/1.1 response, returning its status code """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, value = line.decode('latin1').split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+
+    return status
+
+class Command(BaseCommand):
+    """ Measure requests/sec and server memory usage for a number of concurrent keep-alive connections """
+    help = 'Benchmark a running comments API server (WSGI or ASGI) with many concurrent connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL to request, e.g. http://localhost:8000/api/')
+        parser.add_argument('--connections', type=int, default=1000,
+            help='Number of concurrent connections (default: 1000)')
+        parser.add_argument('--duration', type=float, default=30,
+            help='Number of seconds to send requests for (default: 30)')
+        parser.add_argument('--pid', type=int, action='append', default=[],
+            help='Server process ID to measure memory usage of, including its worker processes (may be given multiple times)')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only http:// URLs are supported')
+        if options['connections'] < 1:
+            raise CommandError('--connections must be at least 1')
+
+        path = url.path or '/'
+        if url.query:
+            path = '{}?{}'.format(path, url.query)
+        request = 'GET {} HTTP/1.1\r\nHost: {}\r\nAccept: application/json\r\n\r\n'.format(path, url.netloc).encode('latin1')
+
+        rss_before = read_rss(options['pid'])
+        loop = asyncio.get_event_loop()
+        results = loop.run_until_complete(self.run(url.hostname, url.port or 80, request, options))
+        completed, errors, elapsed, rss_during = results
+
+        self.stdout.write('Connections: {}'.format(options['connections']))
+        self.stdout.write('Requests: {} ({} errors) in {:.1f}s'.format(completed, errors, elapsed))
+        self.stdout.write('Requests/sec: {:.1f}'.format(completed / elapsed))
+        if options['pid']:
+            per_thousand = (rss_during - rss_before) * 1000.0 / options['connections']
+            self.stdout.write('Server memory: {} kB idle, {} kB under load'.format(rss_before, rss_during))
+            self.stdout.write('Server memory per 1000 connections: {:.0f} kB'.format(per_thousand))
+
+    async def run(self, host, port, request, options):
+        """ Run the benchmark, returning (completed requests, errors, elapsed seconds, peak server RSS in kB) """
+        counts = {'completed': 0, 'errors': 0}
+        deadline = time.monotonic() + options['duration']
+
+        async def connection():
+            reader = writer = None
+            while time.monotonic() < deadline:
+                # Give up on connections and responses still outstanding at the deadline so a stalled connection
+                # can't stop the benchmark from finishing
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), deadline - time.monotonic())
+                    writer.write(request)
+                    status = await asyncio.wait_for(read_response(reader), deadline - time.monotonic())
+                except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    counts['errors'] += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    await asyncio.sleep(0.1)
+                    continue
+                counts['completed' if status < 400 else 'errors'] += 1
+            if writer is not None:
+                writer.close()
+
+        async def monitor():
+            peak = 0
+            while time.monotonic() < deadline:
+                peak = max(peak, read_rss(options['pid']))
+                await asyncio.sleep(1)
+            return peak
+
+        start = time.monotonic()
+        tasks = [connection() for _ in range(options['connections'])]
+        results = await asyncio.gather(monitor(), *tasks)
+        return counts['completed'], counts['errors'], time.monotonic() - start, results[0]
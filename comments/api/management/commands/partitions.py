@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, Error, connections, transaction
+from django.utils import timezone
+
+from ...partitions import ARCHIVE_SCHEMA, PARTITIONED_TABLE, add_months, create_partition, detach_partition, list_partitions, month_start, partition_name
+
+class Command(BaseCommand):
+    """ Create future monthly partitions of the comment table and detach (and optionally archive) old ones """
+    help = 'Create future monthly partitions of the comment table and detach or archive old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+            help='Number of months after the current month to ensure partitions exist for (default: 3)')
+        parser.add_argument('--retain', type=int, default=None,
+            help='Number of months before the current month to keep attached, older partitions are detached (default: keep all)')
+        parser.add_argument('--archive', action='store_true',
+            help='Move detached partitions into the "{}" schema'.format(ARCHIVE_SCHEMA))
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+            help='Database to manage partitions on (default: "{}")'.format(DEFAULT_DB_ALIAS))
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+        if options['retain'] is not None and options['retain'] < 0:
+            raise CommandError('--retain must not be negative')
+
+        connection = connections[options['database']]
+        current_month = month_start(timezone.now())
+        failures = 0
+
+        # Create partitions for the current and upcoming months
+        for offset in range(options['ahead'] + 1):
+            month = add_months(current_month, offset)
+            name = partition_name(PARTITIONED_TABLE, month)
+            try:
+                with transaction.atomic(using=options['database']):
+                    created = create_partition(connection, PARTITIONED_TABLE, month)
+            except Error as e:
+                self.stderr.write('Error creating partition {}: {}'.format(name, e))
+                failures += 1
+                continue
+            self.stdout.write('Partition {} {}'.format(name, 'created' if created else 'exists'))
+
+        # Detach partitions older than the retention period
+        if options['retain'] is not None:
+            cutoff = add_months(current_month, -options['retain'])
+            for name, month in list_partitions(connection, PARTITIONED_TABLE):
+                if month >= cutoff:
+                    continue
+                try:
+                    with transaction.atomic(using=options['database']):
+                        detach_partition(connection, PARTITIONED_TABLE, month, archive=options['archive'])
+                except Error as e:
+                    self.stderr.write('Error detaching partition {}: {}'.format(name, e))
+                    failures += 1
+                    continue
+                self.stdout.write('Partition {} {}'.format(name, 'archived' if options['archive'] else 'detached'))
+
+        if failures:
+            raise CommandError('{} partition operation(s) failed'.format(failures))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text="The comment's full-text search document (maintained by a database trigger)", null=True),
+        ),
+        # Backfill existing comments before the index and trigger exist so the rewrite doesn't also have to
+        # maintain the index or fire the trigger for every row
+        migrations.RunSQL(
+            sql="UPDATE api_comment SET search_vector = to_tsvector('pg_catalog.english', content);",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='api_comment_search_gin'),
+        ),
+        # Keep the search document in step with the content on every insert and update, regardless of
+        # whether the write comes from the API, the admin or a fixture
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER api_comment_search_vector_update
+                BEFORE INSERT OR UPDATE ON api_comment
+                FOR EACH ROW EXECUTE PROCEDURE
+                tsvector_update_trigger(search_vector, 'pg_catalog.english', content);
+            """,
+            reverse_sql="DROP TRIGGER IF EXISTS api_comment_search_vector_update ON api_comment;",
+        ),
+    ]
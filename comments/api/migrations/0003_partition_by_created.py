@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+# Number of months after the current month to create partitions for up front
+PARTITION_MONTHS_AHEAD = 3
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_comments(apps, schema_editor):
+    """ Rebuild the comment table as a table range partitioned by month of creation """
+    connection = schema_editor.connection
+    now = timezone.now()
+    current_month = datetime.datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+
+    # Create the partitioned table with monthly partitions covering the existing comments
+    schema_editor.execute('CREATE TABLE api_comment_partitioned (LIKE api_comment INCLUDING DEFAULTS) PARTITION BY RANGE (created)')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT min(created) FROM api_comment')
+        earliest = cursor.fetchone()[0]
+
+    month = datetime.datetime(earliest.year, earliest.month, 1, tzinfo=timezone.utc) if earliest is not None else current_month
+    while month <= add_months(current_month, PARTITION_MONTHS_AHEAD):
+        schema_editor.execute(
+            'CREATE TABLE api_comment_y{:04d}m{:02d} PARTITION OF api_comment_partitioned FOR VALUES FROM (%s) TO (%s)'.format(month.year, month.month),
+            [month, add_months(month, 1)],
+        )
+        month = add_months(month, 1)
+    schema_editor.execute('CREATE TABLE api_comment_default PARTITION OF api_comment_partitioned DEFAULT')
+
+    # Copy the comments across and swap the partitioned table in place of the original. Dropping the original
+    # also drops the comment tone foreign key as foreign keys can only reference a partitioned table's full
+    # primary key, so deletion of tones along with their comment is left to the ORM.
+    schema_editor.execute('INSERT INTO api_comment_partitioned SELECT * FROM api_comment')
+    schema_editor.execute('ALTER SEQUENCE api_comment_id_seq OWNED BY NONE')
+    schema_editor.execute('DROP TABLE api_comment CASCADE')
+    schema_editor.execute('ALTER TABLE api_comment_partitioned RENAME TO api_comment')
+    schema_editor.execute('ALTER SEQUENCE api_comment_id_seq OWNED BY api_comment.id')
+
+    # Recreate keys, indexes and triggers. Unique constraints on a partitioned table must include the
+    # partition key so the primary key becomes (id, created).
+    schema_editor.execute('ALTER TABLE api_comment ADD PRIMARY KEY (id, created)')
+    schema_editor.execute('CREATE INDEX api_comment_created_idx ON api_comment (created)')
+    schema_editor.execute('CREATE INDEX api_comment_search_gin ON api_comment USING gin (search_vector)')
+    schema_editor.execute("""
+        CREATE TRIGGER api_comment_search_vector_update
+        BEFORE INSERT OR UPDATE ON api_comment
+        FOR EACH ROW EXECUTE PROCEDURE
+        tsvector_update_trigger(search_vector, 'pg_catalog.english', content)
+    """)
+
+def unpartition_comments(apps, schema_editor):
+    """ Rebuild the comment table as a plain table (comments in detached partitions are not restored) """
+    schema_editor.execute('CREATE TABLE api_comment_unpartitioned (LIKE api_comment INCLUDING DEFAULTS)')
+    schema_editor.execute('INSERT INTO api_comment_unpartitioned SELECT * FROM api_comment')
+    schema_editor.execute('ALTER SEQUENCE api_comment_id_seq OWNED BY NONE')
+    schema_editor.execute('DROP TABLE api_comment')
+    schema_editor.execute('ALTER TABLE api_comment_unpartitioned RENAME TO api_comment')
+    schema_editor.execute('ALTER SEQUENCE api_comment_id_seq OWNED BY api_comment.id')
+
+    schema_editor.execute('ALTER TABLE api_comment ADD PRIMARY KEY (id)')
+    schema_editor.execute('CREATE INDEX api_comment_search_gin ON api_comment USING gin (search_vector)')
+    schema_editor.execute("""
+        CREATE TRIGGER api_comment_search_vector_update
+        BEFORE INSERT OR UPDATE ON api_comment
+        FOR EACH ROW EXECUTE PROCEDURE
+        tsvector_update_trigger(search_vector, 'pg_catalog.english', content)
+    """)
+    schema_editor.execute("""
+        DELETE FROM api_commenttone t
+        WHERE NOT EXISTS (SELECT 1 FROM api_comment c WHERE c.id = t.comment_id_id)
+    """)
+    schema_editor.execute("""
+        ALTER TABLE api_commenttone ADD CONSTRAINT api_commenttone_comment_id_id_fk_api_comment_id
+        FOREIGN KEY (comment_id_id) REFERENCES api_comment (id) DEFERRABLE INITIALLY DEFERRED
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_comment_search_vector'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_comments, unpartition_comments),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='comment',
+                    name='created',
+                    field=models.DateTimeField(auto_now_add=True, db_index=True, help_text="The comment's creation date and time"),
+                ),
+                migrations.AlterField(
+                    model_name='commenttone',
+                    name='comment_id',
+                    field=models.ForeignKey(db_constraint=False, help_text="The comment tone's associated comment", on_delete=django.db.models.deletion.CASCADE, related_name='tones', to='api.Comment'),
+                ),
+            ],
+        ),
+    ]
@@ -1,13 +1,30 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+class CommentManager(models.Manager):
+    """ Comment manager which doesn't load the search vector as it's only used by the database when searching """
+    def get_queryset(self):
+        # Leaving the search vector deferred also excludes it from the UPDATE performed when saving a comment
+        return super(CommentManager, self).get_queryset().defer('search_vector')
+
 class Comment(models.Model):
-    """ A comment """
+    """ A comment (stored in a table partitioned by month of creation, see partitions.py) """
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='api_comment_search_gin'),
+        ]
+
     NAME_MAX_LENGTH = 32
+    SEARCH_CONFIG = 'english'
 
     sku = models.CharField(max_length=8, help_text='The comment\'s associated product SKU')
     content = models.TextField(help_text='The comment\'s textual content')
-    created = models.DateTimeField(auto_now_add=True, help_text='The comment\'s creation date and time')
+    created = models.DateTimeField(auto_now_add=True, db_index=True, help_text='The comment\'s creation date and time')
     modified = models.DateTimeField(auto_now=True, help_text='The comment\'s most recent modification date and time')
+    search_vector = SearchVectorField(null=True, editable=False, help_text='The comment\'s full-text search document (maintained by a database trigger)')
+
+    objects = CommentManager()
 
     @property
     def tone(self):
@@ -34,7 +51,7 @@ class CommentTone(models.Model):
         (4, 'sadness'),
     )
 
-    comment_id = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='tones', help_text='The comment tone\'s associated comment')
+    comment_id = models.ForeignKey(Comment, on_delete=models.CASCADE, db_constraint=False, related_name='tones', help_text='The comment tone\'s associated comment')
     tone_type = models.IntegerField(choices=TONE_CHOICES, help_text='The comment tone\'s type (joy, anger, etc)')
     score = models.FloatField(help_text='The comment tone\'s score value')
     created = models.DateTimeField(auto_now_add=True, help_text='The comment tone\'s creation date and time')
@@ -0,0 +1,70 @@
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class CommentPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination which only counts results exactly up to a threshold
+
+    Above the threshold the count is estimated from the query planner's statistics rather than counting every
+    matching row, and the response's `count_approximate` attribute is set.
+    """
+    exact_count_threshold = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.count, self.count_approximate = self.get_count(queryset)
+        self.request = request
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if not self.count_approximate and (self.count == 0 or self.offset > self.count):
+            self.has_next = False
+            return []
+
+        # An estimated count can't tell whether there's a following page so fetch one extra result to find out
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_count(self, queryset):
+        """ Get a (count, approximate) tuple for the queryset, counting at most exact_count_threshold rows """
+        queryset = queryset.order_by()
+        count = queryset[:self.exact_count_threshold + 1].count()
+        if count <= self.exact_count_threshold:
+            return count, False
+        return max(count, self.estimate_count(queryset)), True
+
+    def estimate_count(self, queryset):
+        """ Get the query planner's estimate of the number of rows the queryset will return """
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('count_approximate', self.count_approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
@@ -0,0 +1,132 @@
+"""
+Management of the monthly range partitions of the comment table
+
+Comments are partitioned by month of creation so that list queries, which are ordered by creation date, read the
+partitions in order (in either direction) using each partition's small created index, stopping once a page is
+filled. Lookups by primary key alone can't be pruned and probe the primary key index of every
+attached partition (one small index probe each, most retrievals are served from the comment cache anyway), which
+is one reason to detach old partitions rather than letting them accumulate.
+
+Comment tones are looked up by comment so are stored in a single plain table. When a comment partition is
+detached the tones of its comments are moved into a table of the same name alongside it.
+"""
+import datetime
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import delete_cached_comments
+
+# Table partitioned by month of its created column
+PARTITIONED_TABLE = 'api_comment'
+
+# Table holding the tones of the partitioned table's comments
+TONE_TABLE = 'api_commenttone'
+
+# Schema that archived (detached) partitions are moved into
+ARCHIVE_SCHEMA = 'archive'
+
+PARTITION_NAME_PATTERN = re.compile(r'^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$')
+
+def month_start(value):
+    """ Get the start of the month containing the given date and time """
+    return datetime.datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+def add_months(month, count):
+    """ Get the start of the month the given number of months after (or before, if negative) the given month """
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(table, month):
+    """ Get the name of the partition of the given table holding rows created in the given month """
+    return '{}_y{:04d}m{:02d}'.format(table, month.year, month.month)
+
+def default_partition_name(table):
+    """ Get the name of the partition of the given table holding any rows outside of the monthly partitions """
+    return '{}_default'.format(table)
+
+def create_partition(connection, table, month):
+    """
+    Create the partition of the given table for the given month, returning False if it already exists
+
+    Any rows for the month which have already been stored in the default partition (e.g. because partitions
+    weren't created ahead of time) are moved into the new partition. This should be run in a transaction.
+    """
+    quote_name = connection.ops.quote_name
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    bounds = [month, add_months(month, 1)]
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute('SELECT to_regclass(%s)', [default])
+        if cursor.fetchone()[0] is not None:
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM {} WHERE created >= %s AND created < %s)'.format(quote_name(default)), bounds)
+            in_default = cursor.fetchone()[0]
+        else:
+            in_default = False
+
+        if not in_default:
+            cursor.execute('CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'.format(
+                quote_name(name), quote_name(table)), bounds)
+            return True
+
+        # A partition can't be added while the default partition holds rows belonging to it
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(quote_name(name), quote_name(table)))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM {} WHERE created >= %s AND created < %s RETURNING *) INSERT INTO {} SELECT * FROM moved'.format(
+                quote_name(default), quote_name(name)),
+            bounds,
+        )
+        cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'.format(
+            quote_name(table), quote_name(name)), bounds)
+    return True
+
+def list_partitions(connection, table):
+    """ Get a list of (name, month) tuples for the monthly partitions currently attached to the given table """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_PATTERN.match(name)
+        if match is None or match.group('table') != table:
+            continue
+        month = datetime.datetime(int(match.group('year')), int(match.group('month')), 1, tzinfo=timezone.utc)
+        partitions.append((name, month))
+    return partitions
+
+def detach_partition(connection, table, month, archive=False):
+    """
+    Detach the given month's partition from the given table, moving its comments' tones into a table alongside it
+    and optionally moving both into the archive schema. Once committed the detached comments are removed from the
+    comment cache. This should be run in a transaction.
+    """
+    quote_name = connection.ops.quote_name
+    name = partition_name(table, month)
+    tone_name = partition_name(TONE_TABLE, month)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT id FROM {}'.format(quote_name(name)))
+        pks = [row[0] for row in cursor.fetchall()]
+        cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(quote_name(table), quote_name(name)))
+        cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(quote_name(tone_name), quote_name(TONE_TABLE)))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM {} WHERE comment_id_id IN (SELECT id FROM {}) RETURNING *) INSERT INTO {} SELECT * FROM moved'.format(
+                quote_name(TONE_TABLE), quote_name(name), quote_name(tone_name)),
+        )
+        if archive:
+            cursor.execute('CREATE SCHEMA IF NOT EXISTS {}'.format(quote_name(ARCHIVE_SCHEMA)))
+            for archived in (name, tone_name):
+                cursor.execute('ALTER TABLE {} SET SCHEMA {}'.format(quote_name(archived), quote_name(ARCHIVE_SCHEMA)))
+
+    transaction.on_commit(lambda: delete_cached_comments(pks), using=connection.alias)
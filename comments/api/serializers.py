@@ -2,10 +2,17 @@ from rest_framework import serializers
 
 from .models import Comment, CommentTone
 
+class CommentDataSerializer(serializers.ModelSerializer):
+    """ A comment's fields other than its URL (which depends on the request) as stored in the comment cache """
+
+    class Meta:
+        model = Comment
+        fields = ('sku', 'content', 'tone', 'created', 'modified')
+
 class CommentSerializer(serializers.HyperlinkedModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='api:comment-detail')
 
     class Meta:
         model = Comment
-        fields = ('url', 'sku', 'content', 'tone', 'created', 'modified')
+        fields = ('url',) + CommentDataSerializer.Meta.fields
 
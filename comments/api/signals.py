@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import delete_cached_comment, refresh_cached_comment
+from .models import Comment, CommentTone
+
+# The cache is only updated once the change has been committed, otherwise a concurrent read could cache the
+# previous state of the comment in between
+
+@receiver(post_save, sender=Comment)
+def cache_saved_comment(sender, instance, raw, **kwargs):
+    """ Write saved comments (from the API, admin or elsewhere) through to the cache """
+    pk = instance.pk
+    if raw:
+        # Fixtures may not have loaded the comment's tones yet so leave it to be cached when it's next read
+        transaction.on_commit(lambda: delete_cached_comment(pk))
+        return
+    transaction.on_commit(lambda: refresh_cached_comment(pk))
+
+@receiver(post_delete, sender=Comment)
+def uncache_deleted_comment(sender, instance, **kwargs):
+    """ Remove deleted comments from the cache """
+    pk = instance.pk
+    transaction.on_commit(lambda: delete_cached_comment(pk))
+
+@receiver(post_save, sender=CommentTone)
+@receiver(post_delete, sender=CommentTone)
+def uncache_comment_tone(sender, instance, **kwargs):
+    """ Remove a comment from the cache when its tones change so it's cached with its new tone when next read """
+    pk = instance.comment_id_id
+    transaction.on_commit(lambda: delete_cached_comment(pk))
@@ -4,9 +4,9 @@ from celery.utils.log import get_task_logger
 import requests
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import Error
-from django.core.cache import cache
+from django.db import Error, transaction
 
+from .cache import delete_cached_comment, refresh_cached_comment
 from .models import Comment, CommentTone
 
 # Celery logger
@@ -85,21 +85,20 @@ def fetch_tone(comment_pk):
         # Add to list of this comment's tones
         comment_tones.append(comment_tone)
 
-    # Delete any existing comment tones from the database
+    # Replace the comment's tones. The comment is locked so that overlapping tasks for the same comment (e.g.
+    # after a quick update) run one after the other, and no tones are stored for a comment deleted in the meantime.
     try:
-        comment.tones.all().delete()
-    except Error as e:
-        logger.error('Error deleting existing comment tones: {}'.format(e))
-        return
+        with transaction.atomic():
+            current = Comment.objects.select_for_update().filter(pk=comment_pk).first()
+            if current is None:
+                logger.info('Comment deleted during fetch tone task: {}'.format(comment_pk))
+                transaction.on_commit(lambda: delete_cached_comment(comment_pk))
+                return
+            current.tones.all().delete()
+            CommentTone.objects.bulk_create(comment_tones)
 
-    # Add new comment tones to database
-    try:
-        CommentTone.objects.bulk_create(comment_tones)
+            # Refresh the comment's cached representation with its new tone once it's been committed
+            transaction.on_commit(lambda: refresh_cached_comment(comment_pk))
     except Error as e:
-        logger.error('Error adding comment tones: {}'.format(e))
+        logger.error('Error replacing comment tones: {}'.format(e))
         return
-
-    # Invalidate cache
-    # TODO: Only invalidate the relevant cache keys instead of clearing the whole cache
-    # as this is currently killing performance!
-    cache.clear()
@@ -1,20 +1,54 @@
+import asyncio
 import json
+from io import StringIO
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.conf import settings
+from django.utils import timezone
 
 import requests
 from rest_framework.test import APIClient
 
+from comments.handlers import ASGIHandler
+
+from .cache import comment_cache_key, get_cached_comment, get_cached_comments
+from .models import Comment, CommentTone
+from .pagination import CommentPagination
+from .partitions import PARTITIONED_TABLE, add_months, create_partition, list_partitions, month_start, partition_name
 from .tasks import fetch_tone
 
 class AppTestCase(TestCase):
     """ API tests """
     fixtures = ('comments.json', 'comment-tones.json',)
 
+    # Watson API response for a comment whose tone is disgust
+    TONE_RESPONSE = {
+        "document_tone": {
+            "tone_categories": [{
+                "tones": [
+                    {"score": 0.24748, "tone_id": "anger"},
+                    {"score": 0.322559, "tone_id": "disgust"},
+                    {"score": 0.108639, "tone_id": "fear"},
+                    {"score": 0.105358, "tone_id": "joy"},
+                    {"score": 0.083174, "tone_id": "sadness"}
+                ],
+                "category_id": "emotion_tone",
+            }]
+        }
+    }
+
     def setUp(self):
         self.client = APIClient()
+        cache.clear()
+
+        # Each test runs inside a transaction which is never committed, so run on commit callbacks straight away
+        on_commit = patch('django.db.transaction.on_commit', side_effect=lambda func, using=None: func())
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
 
     def _test_first_comment(self, comment):
         """ Test the provided comment matches the content of the first comment from the fixtures """
@@ -41,6 +75,8 @@ class AppTestCase(TestCase):
         # Check the correct total number of results are returned
         self.assertIn('count', data)
         self.assertEqual(data['count'], 15)
+        self.assertIn('count_approximate', data)
+        self.assertFalse(data['count_approximate'])
 
         # Check the returned results list is correct
         self.assertIn('results', data)
@@ -50,6 +86,74 @@ class AppTestCase(TestCase):
         # Check the first returned comment is correct
         self._test_first_comment(data['results'][0])
 
+    @patch.object(CommentPagination, 'exact_count_threshold', 5)
+    def test_comment_list_approximate_count(self):
+        """ Test comments list with a count above the exact count threshold """
+
+        # Perform request
+        response = self.client.get('/api/', {'limit': 10}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        # Check the count is flagged as approximate
+        self.assertTrue(data['count_approximate'])
+        self.assertGreater(data['count'], 5)
+
+        # Check the next page link is still determined correctly
+        self.assertIsNotNone(data['next'])
+        response = self.client.get('/api/', {'limit': 10, 'offset': 10}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertIsNone(data['next'])
+
+    def test_comment_search(self):
+        """ Test comments full-text search """
+
+        # Perform request
+        response = self.client.get('/api/', {'q': 'love'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        # Check only the matching comments are returned
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['results']), 2)
+
+        # Check matching comments are ordered by relevance rather than creation date
+        older = Comment.objects.create(sku='TEST0003', content='A great product')
+        newer = Comment.objects.create(sku='TEST0003', content='Great, great, great! A really great product')
+        response = self.client.get('/api/', {'q': 'great', 'sku': 'TEST0003'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertListEqual([comment['content'] for comment in data['results']], [newer.content, older.content])
+
+        # Check an explicit ordering overrides relevance
+        response = self.client.get('/api/', {'q': 'great', 'sku': 'TEST0003', 'ordering': 'created'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertListEqual([comment['content'] for comment in data['results']], [older.content, newer.content])
+
+        # Check an invalid ordering doesn't override relevance
+        response = self.client.get('/api/', {'q': 'great', 'sku': 'TEST0003', 'ordering': 'bogus'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertListEqual([comment['content'] for comment in data['results']], [newer.content, older.content])
+
+        # Check search can be combined with the sku filter
+        response = self.client.get('/api/', {'q': 'love', 'sku': 'TEST0002'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['sku'], 'TEST0002')
+
+        # Check the search vector isn't loaded or saved with comments
+        comment = Comment.objects.get(pk=1)
+        self.assertIn('search_vector', comment.get_deferred_fields())
+        comment.content = 'I really love this product, it\'s the best!'
+        comment.save()
+        self.assertEqual(self.client.get('/api/', {'q': 'best'}, format='json').json()['count'], 1)
+
     def test_comment_retrieve(self):
         """ Test comment retrieval """
 
@@ -124,6 +228,32 @@ class AppTestCase(TestCase):
         self.assertIn('content', data)
         self.assertListEqual(data['content'], ['This field may not be blank.'])
 
+    @patch('comments.api.tasks.fetch_tone')
+    def test_comment_cache(self, mock_task):
+        """ Test cached comments are kept up to date """
+
+        # Populate the cache
+        response = self.client.get('/api/', format='json')
+        self.assertEqual(response.status_code, 200)
+        self._test_first_comment(response.json()['results'][0])
+        self.assertIsNotNone(cache.get(comment_cache_key(1)))
+
+        # Check the cached comment is updated
+        response = self.client.patch('/api/1/', {'content': 'Test 1234'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/1/', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], 'Test 1234')
+        response = self.client.get('/api/', format='json')
+        self.assertEqual(response.json()['results'][0]['content'], 'Test 1234')
+
+        # Check the cached comment is removed
+        response = self.client.delete('/api/1/', format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(cache.get(comment_cache_key(1)))
+        response = self.client.get('/api/1/', format='json')
+        self.assertEqual(response.status_code, 404)
+
     def test_comment_delete(self):
         """ Test comment deletion """
 
@@ -159,20 +289,7 @@ class AppTestCase(TestCase):
     @patch('comments.api.tasks.logger')
     def test_comment_tone(self, mock_logger, mock_requests):
         """ Test comment tone creation """
-        mock_requests.return_value.json.return_value = {
-            "document_tone": {
-                "tone_categories": [{
-                    "tones": [
-                        {"score": 0.24748, "tone_id": "anger"},
-                        {"score": 0.322559, "tone_id": "disgust"},
-                        {"score": 0.108639, "tone_id": "fear"},
-                        {"score": 0.105358, "tone_id": "joy"},
-                        {"score": 0.083174, "tone_id": "sadness"}
-                    ],
-                    "category_id": "emotion_tone",
-                }]
-            }
-        }
+        mock_requests.return_value.json.return_value = self.TONE_RESPONSE
 
         # Check fetch tone task succeeds
         fetch_tone(1)
@@ -186,3 +303,243 @@ class AppTestCase(TestCase):
         # Check the returned tone is correct
         self.assertIn('tone', data)
         self.assertEqual(data['tone'], 'disgust')
+
+    @patch('requests.get')
+    @patch('comments.api.tasks.logger')
+    def test_comment_tone_deleted(self, mock_logger, mock_requests):
+        """ Test comment tone creation for a comment deleted while the tones are requested """
+        def delete_comment(*args, **kwargs):
+            Comment.objects.get(pk=1).delete()
+            return watson_response
+        watson_response = mock_requests.return_value
+        watson_response.json.return_value = self.TONE_RESPONSE
+        mock_requests.side_effect = delete_comment
+
+        # Populate the cache
+        self.assertEqual(self.client.get('/api/1/', format='json').status_code, 200)
+
+        # Check no tones are stored and the comment isn't cached again
+        fetch_tone(1)
+        mock_logger.error.assert_not_called()
+        self.assertFalse(CommentTone.objects.filter(comment_id=1).exists())
+        self.assertIsNone(cache.get(comment_cache_key(1)))
+        response = self.client.get('/api/1/', format='json')
+        self.assertEqual(response.status_code, 404)
+
+    @patch('requests.get')
+    @patch('comments.api.tasks.logger')
+    def test_comment_tone_updated(self, mock_logger, mock_requests):
+        """ Test comment tone creation for a comment updated while the tones are requested """
+        def update_comment(*args, **kwargs):
+            comment = Comment.objects.get(pk=1)
+            comment.content = 'Updated'
+            comment.save()
+            return watson_response
+        watson_response = mock_requests.return_value
+        watson_response.json.return_value = self.TONE_RESPONSE
+        mock_requests.side_effect = update_comment
+
+        # Check the cached comment has both the updated content and the new tone
+        fetch_tone(1)
+        mock_logger.error.assert_not_called()
+        data = cache.get(comment_cache_key(1))
+        self.assertEqual(data['content'], 'Updated')
+        self.assertEqual(data['tone'], 'disgust')
+
+    def test_comment_cache_orm(self):
+        """ Test cached comments are kept up to date by changes made outside of the API (e.g. in the admin) """
+
+        # Populate the cache
+        self._test_first_comment(self.client.get('/api/1/', format='json').json())
+
+        # Check saving a comment updates the cache
+        comment = Comment.objects.get(pk=1)
+        comment.content = 'Edited in the admin'
+        comment.save()
+        self.assertEqual(self.client.get('/api/1/', format='json').json()['content'], 'Edited in the admin')
+
+        # Check changing a comment's tones updates the cache
+        comment.tones.filter(tone_type=3).delete()
+        self.assertNotEqual(self.client.get('/api/1/', format='json').json()['tone'], 'joy')
+
+        # Check deleting a comment removes it from the cache
+        comment.delete()
+        self.assertEqual(self.client.get('/api/1/', format='json').status_code, 404)
+
+    def test_partitions(self):
+        """ Test creating and detaching comment table partitions """
+        current_month = month_start(timezone.now())
+        old_month = add_months(current_month, -2)
+        create_partition(connection, PARTITIONED_TABLE, old_month)
+        Comment.objects.filter(pk=1).update(created=old_month)
+        tone_count = CommentTone.objects.filter(comment_id=1).count()
+        self.assertGreater(tone_count, 0)
+
+        # Populate the cache
+        self.assertEqual(self.client.get('/api/1/', format='json').status_code, 200)
+        self.assertIsNotNone(cache.get(comment_cache_key(1)))
+
+        call_command('partitions', ahead=4, retain=1, stdout=StringIO())
+        names = [name for name, month in list_partitions(connection, PARTITIONED_TABLE)]
+
+        # Check partitions exist for the current and upcoming months
+        for offset in range(5):
+            self.assertIn(partition_name(PARTITIONED_TABLE, add_months(current_month, offset)), names)
+
+        # Check partitions older than the retention period have been detached along with their comments' tones
+        self.assertNotIn(partition_name(PARTITIONED_TABLE, old_month), names)
+        self.assertFalse(CommentTone.objects.filter(comment_id=1).exists())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM {}'.format(partition_name('api_commenttone', old_month)))
+            self.assertEqual(cursor.fetchone()[0], tone_count)
+
+        # Check comments are only accessible while their partition is attached, even if they were cached
+        self.assertIsNone(cache.get(comment_cache_key(1)))
+        response = self.client.get('/api/1/', format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/2/', format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_partitions_default(self):
+        """ Test creating a partition for a month which already has comments in the default partition """
+        month = add_months(month_start(timezone.now()), 6)
+        Comment.objects.filter(pk=1).update(created=month)
+
+        call_command('partitions', ahead=6, stdout=StringIO())
+
+        # Check the comment has been moved into the new partition
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM {}'.format(partition_name(PARTITIONED_TABLE, month)))
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1])
+        response = self.client.get('/api/1/', format='json')
+        self.assertEqual(response.status_code, 200)
+
+class CacheTestCase(TransactionTestCase):
+    """ Comment cache tests (changes must be committed for the cache to be updated) """
+    fixtures = ('comments.json', 'comment-tones.json',)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_fill_concurrent_update(self):
+        """ Test a cache fill doesn't overwrite a comment updated after it was read """
+        add = cache.add
+
+        def update_then_add(*args, **kwargs):
+            comment = Comment.objects.get(pk=1)
+            comment.content = 'Updated'
+            comment.save()
+            return add(*args, **kwargs)
+
+        # Fill the cache, updating the comment in between reading it and adding it to the cache
+        with patch.object(cache, 'add', side_effect=update_then_add):
+            comments = get_cached_comments([1])
+        self.assertEqual(comments[0][1]['content'], 'I really love this product, it\'s the best!')
+
+        # Check the cache holds the updated comment
+        self.assertEqual(cache.get(comment_cache_key(1))['content'], 'Updated')
+
+    def test_cache_update_committed(self):
+        """ Test a comment is only updated in the cache once the change is committed """
+        self.assertEqual(get_cached_comment(1)['content'], 'I really love this product, it\'s the best!')
+
+        with transaction.atomic():
+            comment = Comment.objects.get(pk=1)
+            comment.content = 'Updated'
+            comment.save()
+            self.assertEqual(cache.get(comment_cache_key(1))['content'], 'I really love this product, it\'s the best!')
+
+        self.assertEqual(cache.get(comment_cache_key(1))['content'], 'Updated')
+
+class ASGITestCase(TransactionTestCase):
+    """ ASGI application tests (requests are processed on other threads so the fixtures must be committed) """
+    fixtures = ('comments.json', 'comment-tones.json',)
+
+    def setUp(self):
+        cache.clear()
+        self.handler = ASGIHandler(max_workers=2)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.handler.executor.shutdown()
+        self.loop.close()
+
+    def _call(self, scope, messages):
+        """ Call the ASGI application with the given scope and received messages, returning the sent messages """
+        messages = list(messages)
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(self.handler(scope, receive, send))
+        return sent
+
+    def _scope(self, method, path):
+        """ Get an ASGI HTTP scope for a JSON request """
+        return {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'accept', b'application/json'), (b'content-type', b'application/json')],
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 12345),
+        }
+
+    def test_asgi_retrieve(self):
+        """ Test comment retrieval through the ASGI application """
+        sent = self._call(self._scope('GET', '/api/1/'), [{'type': 'http.request', 'body': b'', 'more_body': False}])
+
+        # Check the response is sent as a start message followed by a body message
+        self.assertListEqual([message['type'] for message in sent], ['http.response.start', 'http.response.body'])
+        self.assertEqual(sent[0]['status'], 200)
+        headers = dict(sent[0]['headers'])
+        self.assertEqual(headers[b'Content-Type'], b'application/json')
+
+        # Check the returned comment is correct
+        data = json.loads(sent[1]['body'].decode('utf8'))
+        self.assertEqual(data['url'], 'http://testserver/api/1/')
+        self.assertEqual(data['content'], 'I really love this product, it\'s the best!')
+        self.assertEqual(data['tone'], 'joy')
+
+    def test_asgi_disconnect(self):
+        """ Test a client disconnecting before sending the whole request body """
+        sent = self._call(self._scope('POST', '/api/'), [
+            {'type': 'http.request', 'body': b'{"sku": "TEST1234", ', 'more_body': True},
+            {'type': 'http.disconnect'},
+        ])
+
+        # Check no response is sent and no comment is created
+        self.assertListEqual(sent, [])
+        self.assertEqual(Comment.objects.count(), 15)
+
+    def test_asgi_lifespan(self):
+        """ Test server startup and shutdown events """
+        sent = self._call({'type': 'lifespan'}, [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        self.assertListEqual([message['type'] for message in sent], ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    def test_asgi_environ(self):
+        """ Test building WSGI environs for requests received by the ASGI application """
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/',
+            'query_string': b'sku=TEST0001&q=love',
+            'headers': [(b'host', b'testserver'), (b'accept', b'application/json'), (b'content-length', b'0')],
+            'server': ('testserver', 8000),
+            'client': ('127.0.0.1', 12345),
+        }
+        environ = self.handler.build_environ(scope, b'')
+
+        self.assertEqual(environ['REQUEST_METHOD'], 'GET')
+        self.assertEqual(environ['PATH_INFO'], '/api/')
+        self.assertEqual(environ['QUERY_STRING'], 'sku=TEST0001&q=love')
+        self.assertEqual(environ['HTTP_HOST'], 'testserver')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'application/json')
+        self.assertEqual(environ['CONTENT_LENGTH'], '0')
+        self.assertEqual(environ['SERVER_PORT'], '8000')
+        self.assertEqual(environ['REMOTE_ADDR'], '127.0.0.1')
@@ -1,6 +1,15 @@
-from rest_framework import viewsets
+from collections import OrderedDict
 
+from django.http import Http404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, viewsets
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from .cache import get_cached_comment, get_cached_comments
+from .filters import CommentSearchFilter
 from .models import Comment
+from .pagination import CommentPagination
 from .serializers import CommentSerializer
 from .tasks import fetch_tone
 
@@ -15,7 +24,9 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     Clients can move through pages of results by following the URLs in the `next` and `previous` attributes. If there are no succeeding/preceding results then the `next`/`previous` attributes will be `null`.
 
-    The total number of comments across all pages is specified in the `count` attribute.
+    The total number of comments across all pages is specified in the `count` attribute. For large result sets this is an estimate, in which case the `count_approximate` attribute will be `true`.
+
+    Comments may be searched by passing search terms in the `q` parameter. Matching comments are ordered by relevance unless an explicit `ordering` is also requested. Searches can be combined with the `sku` filter and pagination.
 
     retrieve:
     Return the specified comment
@@ -55,9 +66,35 @@ class CommentViewSet(viewsets.ModelViewSet):
     """
     queryset = Comment.objects.all().order_by('-created')
     serializer_class = CommentSerializer
+    filter_backends = (DjangoFilterBackend, filters.OrderingFilter, CommentSearchFilter)
+    pagination_class = CommentPagination
     filter_fields = ('sku',)
     ordering = ('created',)
 
+    def list(self, request, *args, **kwargs):
+        """ List comments by fetching only the matching comment IDs and getting their representations from the cache """
+        queryset = self.filter_queryset(self.get_queryset()).values_list('pk', flat=True)
+
+        page = self.paginate_queryset(queryset)
+        pks = page if page is not None else queryset
+        data = [self._represent(pk, comment) for pk, comment in get_cached_comments(list(pks))]
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Get comment representation from the cache """
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+
+        comment = get_cached_comment(pk)
+        if comment is None:
+            raise Http404
+        return Response(self._represent(pk, comment))
+
     def perform_create(self, serializer):
         """ Queue fetch tone task after creating comment """
         super(CommentViewSet, self).perform_create(serializer)
@@ -68,5 +105,11 @@ class CommentViewSet(viewsets.ModelViewSet):
         super(CommentViewSet, self).perform_update(serializer)
         self._fetch_tone(serializer.instance)
 
+    def _represent(self, pk, comment):
+        """ Add the request dependent URL to a cached comment representation """
+        data = OrderedDict([('url', reverse('api:comment-detail', kwargs={'pk': pk}, request=self.request))])
+        data.update(comment)
+        return data
+
     def _fetch_tone(self, instance):
         fetch_tone.delay(instance.pk)
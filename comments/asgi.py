@@ -0,0 +1,18 @@
+"""
+ASGI config for comments project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g. ``uvicorn comments.asgi:application``.
+"""
+
+import os
+
+import django
+from django.conf import settings
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "comments.settings")
+django.setup()
+
+from comments.handlers import ASGIHandler
+
+application = ASGIHandler(max_workers=settings.ASGI_THREAD_POOL_SIZE)
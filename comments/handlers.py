@@ -0,0 +1,109 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+
+class ASGIHandler(object):
+    """
+    ASGI application serving Django requests without a thread per connection
+
+    Receiving requests and sending responses is done on the event loop, so slow clients and idle keep-alive
+    connections only cost a coroutine. Django itself (middleware, views and the ORM) is blocking so each request
+    is processed by the standard WSGI handler in a thread pool of bounded size.
+    """
+
+    def __init__(self, max_workers):
+        self.wsgi_handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type: {}'.format(scope['type']))
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+
+        environ = self.build_environ(scope, body)
+        loop = asyncio.get_event_loop()
+        status, headers, content = await loop.run_in_executor(self.executor, self.run_wsgi, environ)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        """ Handle server startup and shutdown events """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """ Read the full request body, returning None if the client disconnects first """
+        body = BytesIO()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                return body.getvalue()
+
+    def build_environ(self, scope, body):
+        """ Build a WSGI environ dict for the given ASGI HTTP scope and request body """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_{}'.format(name)
+            if name in environ:
+                value = '{},{}'.format(environ[name], value)
+            environ[name] = value
+
+        return environ
+
+    def run_wsgi(self, environ):
+        """ Process a request with the WSGI handler, returning the response's (status, headers, content) """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+        result = self.wsgi_handler(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        return response['status'], response['headers'], content